@@ -13,6 +13,7 @@ class Settings(BaseSettings):
     kavita_base_url: str = "http://localhost:5000"
     kavita_api_key: str = ""  # Required API key
     kavita_plugin_name: str = "ESP32Reader"  # Plugin name for authentication
+    kavita_cache_ttl: float = 60.0  # Seconds to reuse library/series/volume lists
 
     # Display Configuration (4.2" e-paper = 400x300)
     display_width: int = 400
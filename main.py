@@ -1,8 +1,12 @@
+import asyncio
 import logging
+import orjson
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Response
+from fastapi import Depends, FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 
 from config import settings
@@ -33,8 +37,12 @@ async def lifespan(app: FastAPI):
     logger.info("Starting E-Reader OS API server...")
     db.init_db()
 
-    await connect_kavita_server()
-    await html_engine.start()
+    # Shared per-app services, handed to endpoints through Depends()
+    app.state.renderer = Renderer()
+    app.state.workflow = WorkflowManager()
+
+    # Independent startup steps: authenticate while Chromium launches
+    await asyncio.gather(connect_kavita_server(), html_engine.start())
 
     # Initialize image processor
     # image_processor = ImageProcessor(
@@ -50,8 +58,10 @@ async def lifespan(app: FastAPI):
     yield
 
     # Cleanup
+    app.state.workflow.flush_scroll()
     if kavita_client:
         await kavita_client.close()
+    await html_engine.stop()
 
     logger.info("Server shutdown complete")
 
@@ -62,6 +72,7 @@ app = FastAPI(
     description="API server for ESP32-based e-reader devices",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware
@@ -82,34 +93,55 @@ app.include_router(books.router)
 # app.include_router(button_config.router)
 
 
-@app.get("/")
-def root():
-    """Root endpoint"""
-    return {
+# Settings don't change at runtime, so these bodies are serialized once
+ROOT_PAYLOAD = orjson.dumps(
+    {
         "message": "E-Reader OS API",
         "version": "1.0.0",
         "docs": "/docs",
     }
+)
+
+# Keyed by whether the Kavita client currently holds a token
+HEALTH_PAYLOADS = {
+    connected: orjson.dumps(
+        {
+            "status": "healthy",
+            "kavita": {
+                "connected": connected,
+                "base_url": settings.kavita_base_url,
+            },
+            "display": {
+                "width": settings.display_width,
+                "height": settings.display_height,
+                "font_size": settings.font_size,
+            },
+        }
+    )
+    for connected in (True, False)
+}
+
+
+@app.get("/")
+def root():
+    """Root endpoint"""
+    return Response(content=ROOT_PAYLOAD, media_type="application/json")
 
 
 @app.get("/health")
 def health_check():
     """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "kavita": {
-            "connected": kavita_client.token is not None,
-            "base_url": settings.kavita_base_url,
-        },
-        "display": {
-            "width": settings.display_width,
-            "height": settings.display_height,
-            "font_size": settings.font_size,
-        },
-    }
+    return Response(
+        content=HEALTH_PAYLOADS[kavita_client.token is not None], media_type="application/json"
+    )
 
 
-workflow = WorkflowManager()
+def get_renderer(request: Request) -> Renderer:
+    return request.app.state.renderer
+
+
+def get_workflow(request: Request) -> WorkflowManager:
+    return request.app.state.workflow
 
 
 class ButtonEvent(BaseModel):
@@ -118,11 +150,13 @@ class ButtonEvent(BaseModel):
 
 
 @app.post("/api/button")
-async def receive_button_event(event: ButtonEvent):
+async def receive_button_event(
+    event: ButtonEvent, workflow: WorkflowManager = Depends(get_workflow)
+):
     """
     Receives input from ESP32 and delegates it to the Workflow Manager.
     """
-    print(f"🔔 Input: {event.button} ({event.type})")
+    logger.debug("Input: %s (%s)", event.button, event.type)
 
     # CRITICAL CHANGE: Logic is now delegated
     # The API doesn't know about "Libraries" or "Pages".
@@ -134,11 +168,12 @@ async def receive_button_event(event: ButtonEvent):
     return {"status": "ok"}
 
 
-renderer = Renderer()
-
-
 @app.get("/api/current")
-async def get_current_view():
+async def get_current_view(
+    renderer: Renderer = Depends(get_renderer), workflow: WorkflowManager = Depends(get_workflow)
+):
+    # Scroll presses may still be buffered; the frame must show them
+    workflow.flush_scroll()
     state = db.get_state()
     mode = state["mode"]
     cursor = state["cursor_index"]
@@ -146,8 +181,11 @@ async def get_current_view():
     if mode == "LIBRARIES":
         libraries = await kavita_client.get_libraries()
         return Response(
-            content=renderer.render_list_view(
-                "LIBRARIES", [library.get("name") for library in libraries], cursor
+            content=await run_in_threadpool(
+                renderer.render_list_view,
+                "LIBRARIES",
+                [library.get("name") for library in libraries],
+                cursor,
             ),
             media_type="application/octet-stream",
         )
@@ -157,8 +195,11 @@ async def get_current_view():
         items = await kavita_client.get_series(lib_id)
 
         return Response(
-            content=renderer.render_list_view(
-                "SELECT SERIES", [series.get("name") for series in items], cursor
+            content=await run_in_threadpool(
+                renderer.render_list_view,
+                "SELECT SERIES",
+                [series.get("name") for series in items],
+                cursor,
             ),
             media_type="application/octet-stream",
         )
@@ -168,8 +209,11 @@ async def get_current_view():
         items = await kavita_client.get_series_volumes(series_id)
 
         return Response(
-            content=renderer.render_list_view(
-                "SELECT BOOK", [series.get("name") for series in items], cursor
+            content=await run_in_threadpool(
+                renderer.render_list_view,
+                "SELECT BOOK",
+                [series.get("name") for series in items],
+                cursor,
             ),
             media_type="application/octet-stream",
         )
@@ -181,41 +225,54 @@ async def get_current_view():
         orientation = state["orientation"]
         dither_mode = state["dither_mode"]
 
-        # 1. Handle "Negative Scroll" (User pressed UP at top of page)
-        # We need to go to Previous Page -> Bottom
-        if scroll_step < 0:
-            print("🔄 Scrolling Back to Previous Page...")
-            new_page = page_num - 1
-            # Fetch prev page HTML to calculate its height
-            prev_html = await kavita_client.get_book_page(chapter_id, new_page)
-            # Ask engine: "What is the last step index for this html?"
-            last_step = await html_engine.render_scroll_view(
-                prev_html, -1, renderer, orientation, dither_mode
+        # Top of the first page: there is no previous page to fetch, so
+        # clamp the scroll locally instead of asking Kavita for page -1
+        if scroll_step < 0 and page_num == 0:
+            scroll_step = 0
+            db.update_state({"scroll_step": 0})
+
+        # Page changes update the local position (and the DB) and loop until
+        # a renderable slice is found, rather than re-entering the endpoint
+        while True:
+            # 1. Handle "Negative Scroll" (User pressed UP at top of page)
+            # We need to go to Previous Page -> Bottom
+            if scroll_step < 0:
+                logger.debug("Scrolling back to previous page")
+                new_page = page_num - 1
+                # Fetch prev page HTML to calculate its height
+                prev_html = await kavita_client.get_book_page(chapter_id, new_page)
+                # Ask engine: "What is the last step index for this html?"
+                last_step = await html_engine.render_scroll_view(
+                    prev_html, -1, renderer, orientation, dither_mode
+                )
+
+                # Update DB and render the new position
+                page_num, scroll_step = new_page, last_step
+                db.update_state({"current_page": page_num, "scroll_step": scroll_step})
+                continue
+
+            # 2. Fetch Content
+            html = await kavita_client.get_book_page(chapter_id, page_num)
+            # Fetch the next pages while this one renders and is being read
+            kavita_client.prefetch_book_pages(chapter_id, page_num + 1)
+            html = html.replace("//192.168.0.4:5000/", "http://192.168.0.4:5000/")
+
+            # 3. Try to Render
+            result = await html_engine.render_scroll_view(
+                html, scroll_step, renderer, orientation, dither_mode
             )
 
-            # Update DB and Recursively Render
-            db.update_state({"current_page": new_page, "scroll_step": last_step})
-            return await get_current_view()
-
-        # 2. Fetch Content
-        html = await kavita_client.get_book_page(chapter_id, page_num)
-        html = html.replace("//192.168.0.4:5000/", "http://192.168.0.4:5000/")
-
-        # 3. Try to Render
-        result = await html_engine.render_scroll_view(
-            html, scroll_step, renderer, orientation, dither_mode
-        )
-
-        # 4. Handle "End of Content" (User pressed DOWN at bottom)
-        if result == "NEXT":
-            print(f"🔄 Advancing to Next Page (From Page {page_num})")
+            # 4. Handle "End of Content" (User pressed DOWN at bottom)
+            if result == "NEXT":
+                logger.debug("Advancing to next page (from page %s)", page_num)
 
-            # Update DB: Next Page, Reset Scroll to Top
-            db.update_state({"current_page": page_num + 1, "scroll_step": 0})
-            return await get_current_view()
+                # Update DB: Next Page, Reset Scroll to Top
+                page_num, scroll_step = page_num + 1, 0
+                db.update_state({"current_page": page_num, "scroll_step": scroll_step})
+                continue
 
-        # 5. Return Valid Image
-        return Response(content=result, media_type="application/octet-stream")
+            # 5. Return Valid Image
+            return Response(content=result, media_type="application/octet-stream")
 
 
 if __name__ == "__main__":
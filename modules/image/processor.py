@@ -4,14 +4,50 @@ Converts text and images to 1-bit format for ESP32 e-paper displays (400x300)
 """
 
 from enum import Enum
-from PIL import Image, ImageDraw, ImageFont, ImageEnhance
+from PIL import Image, ImageDraw, ImageFont, ImageEnhance, ImageStat
+import functools
 import io
+import numpy as np
 from typing import Optional
 import logging
 
+try:
+    from numba import njit
+except ImportError:  # Optional: pip install ".[speedups]"
+    njit = None
+
 logger = logging.getLogger(__name__)
 
 
+if njit is not None:
+
+    @njit(cache=True)
+    def _fs4_kernel(arr):
+        """In-place 4-level Floyd-Steinberg over an int16 (height, width) array"""
+        height, width = arr.shape
+        for y in range(height):
+            for x in range(width):
+                old_pixel = arr[y, x]
+                # Same thresholds as _quantize_4level: the top two bits pick the level
+                new_pixel = (old_pixel >> 6) * 85
+                arr[y, x] = new_pixel
+
+                error = old_pixel - new_pixel
+
+                # Distribute error to neighboring pixels (>> 4 floors like // 16)
+                if x + 1 < width:
+                    arr[y, x + 1] = min(255, max(0, arr[y, x + 1] + (error * 7 >> 4)))
+                if y + 1 < height:
+                    if x - 1 >= 0:
+                        arr[y + 1, x - 1] = min(255, max(0, arr[y + 1, x - 1] + (error * 3 >> 4)))
+                    arr[y + 1, x] = min(255, max(0, arr[y + 1, x] + (error * 5 >> 4)))
+                    if x + 1 < width:
+                        arr[y + 1, x + 1] = min(255, max(0, arr[y + 1, x + 1] + (error >> 4)))
+
+else:
+    _fs4_kernel = None
+
+
 class ColorMode(Enum):
     ONE_BIT = "1bit"  # Black and white only
     FOUR_LEVEL = "4level"  # Black, dark gray, light gray, white
@@ -30,10 +66,14 @@ class ImageProcessor:
         height: int = 300,
         font_path: Optional[str] = None,
         font_size: int = 20,
+        resize_filter_1bit: Image.Resampling = Image.Resampling.HAMMING,
     ):
         self.width = width
         self.height = height
         self.font_size = font_size
+        # Dithering to 1 bit discards the fine detail LANCZOS keeps, so the
+        # 1-bit path can use a cheaper filter; 4-level output keeps LANCZOS
+        self.resize_filter_1bit = resize_filter_1bit
 
         # Try to load font, fallback to default
         try:
@@ -45,6 +85,15 @@ class ImageProcessor:
             logger.warning(f"Failed to load font: {e}, using default")
             self.font = ImageFont.load_default()
 
+        # Word widths repeat a lot in running text ("the", "and", ...)
+        self._text_width = functools.lru_cache(maxsize=4096)(self.font.getlength)
+
+        # Lookup tables for img.point(), so PIL maps pixels in C
+        self._lut4 = bytes(self._quantize_4level(v) for v in range(256))
+        self._lut_threshold_cache = {}  # {threshold: lut}
+        self._lut_contrast_cache = {}  # {image mean: lut}
+        self._lut_brightness = self._blend_lut(0, 1.1)
+
     def text_to_1bit_image(
         self, text: str, padding: int = 10, line_spacing: int = 5
     ) -> Image.Image:
@@ -85,30 +134,41 @@ class ImageProcessor:
         try:
             img = Image.open(io.BytesIO(image_data))
 
+            # JPEG only (no-op otherwise): let libjpeg decode straight to
+            # grayscale, scaled down in the DCT to about 2x the display size
+            draft_side = 2 * min(self.width, self.height)
+            img.draft("L", (draft_side, draft_side))
+
             # Auto-rotate portrait images to landscape if needed
+            rotate = False
             if auto_rotate:
                 img_width, img_height = img.size
                 display_is_landscape = self.width > self.height
                 image_is_portrait = img_height > img_width
 
                 # If display is landscape but image is portrait, rotate 90 degrees
-                if display_is_landscape and image_is_portrait:
-                    # Rotate counter-clockwise (90 degrees) to make it landscape
-                    img = img.rotate(90, expand=True)
-                    logger.info(f"Rotated portrait image {img_width}x{img_height} to landscape")
+                rotate = display_is_landscape and image_is_portrait
 
-            # Resize to fit display while maintaining aspect ratio
-            img.thumbnail((self.width, self.height), Image.Resampling.LANCZOS)
+            # Resize to fit display while maintaining aspect ratio. An image that
+            # will be rotated fits the swapped box, so it is only rotated once small
+            box = (self.height, self.width) if rotate else (self.width, self.height)
+            img.thumbnail(box, self.resize_filter_1bit)
 
-            # Convert to grayscale first
-            img = img.convert("L")
+            if rotate:
+                # Rotate counter-clockwise (90 degrees) to make it landscape
+                img = img.transpose(Image.Transpose.ROTATE_90)
+                logger.info(f"Rotated portrait image {img_width}x{img_height} to landscape")
+
+            # Convert to grayscale first (JPEG drafts already decode as L)
+            if img.mode != "L":
+                img = img.convert("L")
 
             # Apply selected dithering/threshold method
             if dither_mode == DitherMode.FLOYD_STEINBERG:
                 img = img.convert("1", dither=Image.Dither.FLOYDSTEINBERG)
             elif dither_mode == DitherMode.THRESHOLD:
                 # Manual threshold conversion
-                img = img.point(lambda x: 255 if x > threshold else 0, mode="1")
+                img = img.point(self._threshold_lut(threshold), mode="1")
             elif dither_mode == DitherMode.NONE:
                 img = img.convert("1", dither=Image.Dither.NONE)
 
@@ -144,34 +204,44 @@ class ImageProcessor:
         try:
             img = Image.open(io.BytesIO(image_data))
 
+            # JPEG only (no-op otherwise): let libjpeg decode straight to
+            # grayscale, scaled down in the DCT to about 2x the display size
+            draft_side = 2 * min(self.width, self.height)
+            img.draft("L", (draft_side, draft_side))
+
             # Auto-rotate portrait images to landscape if needed
+            rotate = False
             if auto_rotate:
                 img_width, img_height = img.size
                 display_is_landscape = self.width > self.height
                 image_is_portrait = img_height > img_width
 
                 # If display is landscape but image is portrait, rotate 90 degrees
-                if display_is_landscape and image_is_portrait:
-                    # Rotate counter-clockwise (90 degrees) to make it landscape
-                    img = img.rotate(90, expand=True)
-                    logger.info(f"Rotated portrait image {img_width}x{img_height} to landscape")
+                rotate = display_is_landscape and image_is_portrait
 
-            # Resize to fit display while maintaining aspect ratio
-            img.thumbnail((self.width, self.height), Image.Resampling.LANCZOS)
+            # Resize to fit display while maintaining aspect ratio. An image that
+            # will be rotated fits the swapped box, so it is only rotated once small
+            box = (self.height, self.width) if rotate else (self.width, self.height)
+            img.thumbnail(box, Image.Resampling.LANCZOS)
 
-            # Convert to grayscale first
-            img = img.convert("L")
+            if rotate:
+                # Rotate counter-clockwise (90 degrees) to make it landscape
+                img = img.transpose(Image.Transpose.ROTATE_90)
+                logger.info(f"Rotated portrait image {img_width}x{img_height} to landscape")
 
-            enhancer = ImageEnhance.Contrast(img)
-            img = enhancer.enhance(1.5)  # 1.5x contrast
+            # Convert to grayscale first (JPEG drafts already decode as L)
+            if img.mode != "L":
+                img = img.convert("L")
+
+            # 1.5x contrast around the image mean, as ImageEnhance.Contrast does
+            img = img.point(self._contrast_lut(img))
 
             # Increase sharpness (crisper text)
             enhancer = ImageEnhance.Sharpness(img)
             img = enhancer.enhance(2.0)  # 2x sharpness
 
             # Slightly increase brightness (prevents muddy grays)
-            enhancer = ImageEnhance.Brightness(img)
-            img = enhancer.enhance(1.1)
+            img = img.point(self._lut_brightness)
 
             # Apply color mode conversion
             if color_mode == ColorMode.ONE_BIT:
@@ -179,7 +249,7 @@ class ImageProcessor:
                 if dither_mode == DitherMode.FLOYD_STEINBERG:
                     img = img.convert("1", dither=Image.Dither.FLOYDSTEINBERG)
                 elif dither_mode == DitherMode.THRESHOLD:
-                    img = img.point(lambda x: 255 if x > threshold else 0, mode="1")
+                    img = img.point(self._threshold_lut(threshold), mode="1")
                 elif dither_mode == DitherMode.NONE:
                     img = img.convert("1", dither=Image.Dither.NONE)
 
@@ -196,7 +266,7 @@ class ImageProcessor:
                     img = self._convert_4level_threshold(img)
                 elif dither_mode == DitherMode.NONE:
                     # Simple quantization to 4 levels
-                    img = img.point(lambda x: self._quantize_4level(x))
+                    img = img.point(self._lut4)
 
                 # Center on white background
                 centered = Image.new("L", (self.width, self.height), 255)
@@ -213,74 +283,102 @@ class ImageProcessor:
 
     def _quantize_4level(self, value: int) -> int:
         """Quantize grayscale value to 4 levels"""
-        if value < 64:
-            return 0  # Black
-        elif value < 128:
-            return 85  # Dark gray
-        elif value < 192:
-            return 170  # Light gray
-        else:
-            return 255  # White
+        # The top two bits pick the level: black 0, dark gray 85, light gray
+        # 170, white 255 (3 * 85), with no branches
+        return (value >> 6) * 85
 
     def _convert_4level_threshold(self, img: Image.Image) -> Image.Image:
         """Convert to 4-level grayscale using threshold method"""
-        return img.point(self._quantize_4level)
+        return img.point(self._lut4)
+
+    def _threshold_lut(self, threshold: int) -> bytes:
+        """Get the 1-bit lookup table for a threshold (white above it)"""
+        lut = self._lut_threshold_cache.get(threshold)
+        if lut is None:
+            lut = bytes(255 if v > threshold else 0 for v in range(256))
+            self._lut_threshold_cache[threshold] = lut
+        return lut
+
+    def _contrast_lut(self, img: Image.Image) -> bytes:
+        """Get the 1.5x contrast lookup table for an image's mean gray level"""
+        mean = int(ImageStat.Stat(img).mean[0] + 0.5)
+        lut = self._lut_contrast_cache.get(mean)
+        if lut is None:
+            lut = self._blend_lut(mean, 1.5)
+            self._lut_contrast_cache[mean] = lut
+        return lut
+
+    @staticmethod
+    def _blend_lut(degenerate: int, factor: float) -> bytes:
+        """Lookup table for ImageEnhance's blend against a flat gray image"""
+        ramp = Image.frombytes("L", (256, 1), bytes(range(256)))
+        flat = Image.new("L", (256, 1), degenerate)
+        return Image.blend(flat, ramp, factor).tobytes()
 
     def _dither_4level_floyd_steinberg(self, img: Image.Image) -> Image.Image:
         """Apply Floyd-Steinberg dithering for 4-level grayscale"""
-        pixels = img.load()
-        width, height = img.size
+        if _fs4_kernel is not None:
+            arr = np.asarray(img, dtype=np.int16).copy()
+            _fs4_kernel(arr)
+            return Image.fromarray(arr.astype(np.uint8))
 
-        # Create a copy to work with
-        result = img.copy()
-        result_pixels = result.load()
+        # Pure-Python fallback: a flat row-major buffer is several times faster
+        # than PixelAccess, which dispatches on an (x, y) tuple per access
+        width, height = img.size
+        buf = bytearray(img.tobytes())
 
         for y in range(height):
+            row = y * width
+            has_below = y + 1 < height
             for x in range(width):
-                old_pixel = result_pixels[x, y]
-                new_pixel = self._quantize_4level(old_pixel)
-                result_pixels[x, y] = new_pixel
+                i = row + x
+                old_pixel = buf[i]
+                new_pixel = (old_pixel >> 6) * 85  # _quantize_4level, inlined
+                buf[i] = new_pixel
 
                 error = old_pixel - new_pixel
 
                 # Distribute error to neighboring pixels
                 if x + 1 < width:
-                    result_pixels[x + 1, y] = min(
-                        255, max(0, result_pixels[x + 1, y] + error * 7 // 16)
-                    )
-                if x - 1 >= 0 and y + 1 < height:
-                    result_pixels[x - 1, y + 1] = min(
-                        255, max(0, result_pixels[x - 1, y + 1] + error * 3 // 16)
-                    )
-                if y + 1 < height:
-                    result_pixels[x, y + 1] = min(
-                        255, max(0, result_pixels[x, y + 1] + error * 5 // 16)
-                    )
-                if x + 1 < width and y + 1 < height:
-                    result_pixels[x + 1, y + 1] = min(
-                        255, max(0, result_pixels[x + 1, y + 1] + error * 1 // 16)
-                    )
-
-        return result
+                    v = buf[i + 1] + error * 7 // 16
+                    buf[i + 1] = v if 0 <= v <= 255 else (0 if v < 0 else 255)
+                if has_below:
+                    j = i + width
+                    if x - 1 >= 0:
+                        v = buf[j - 1] + error * 3 // 16
+                        buf[j - 1] = v if 0 <= v <= 255 else (0 if v < 0 else 255)
+                    v = buf[j] + error * 5 // 16
+                    buf[j] = v if 0 <= v <= 255 else (0 if v < 0 else 255)
+                    if x + 1 < width:
+                        v = buf[j + 1] + error * 1 // 16
+                        buf[j + 1] = v if 0 <= v <= 255 else (0 if v < 0 else 255)
+
+        return Image.frombytes("L", (width, height), bytes(buf))
 
     def _wrap_text(self, text: str, max_width: int) -> list:
         """Wrap text to fit within max_width"""
         words = text.split()
         lines = []
         current_line = []
+        current_width = 0.0
+        space_width = self._text_width(" ")
 
         for word in words:
-            # Check if adding this word exceeds width
-            test_line = " ".join(current_line + [word])
-            bbox = self.font.getbbox(test_line)
-            width = bbox[2] - bbox[0]
+            # Check if adding this word exceeds width (each word is measured once)
+            word_width = self._text_width(word)
+            if current_line:
+                width = current_width + space_width + word_width
+            else:
+                width = word_width
 
             if width <= max_width:
                 current_line.append(word)
+                current_width = width
             else:
                 if current_line:
                     lines.append(" ".join(current_line))
                 current_line = [word]
+                current_width = word_width
 
         if current_line:
             lines.append(" ".join(current_line))
@@ -288,15 +386,31 @@ class ImageProcessor:
         return lines
 
     def image_to_bytes(self, img: Image.Image, format: str = "PNG") -> bytes:
-        """Convert PIL Image to bytes"""
+        """Convert PIL Image to bytes
+
+        "RAW" returns image_to_raw_bytes(): the packed ESP32 framebuffer for
+        mode "1", but 1 byte per pixel (not the 2-bit format) for "L" images.
+        """
+        if format == "RAW":
+            return self.image_to_raw_bytes(img)
+
         buf = io.BytesIO()
-        img.save(buf, format=format)
+        if format == "PNG":
+            # Frames are small; zlib's default effort costs more than it saves
+            img.save(buf, format=format, compress_level=1)
+        else:
+            img.save(buf, format=format)
         return buf.getvalue()
 
     def image_to_raw_bytes(self, img: Image.Image) -> bytes:
         """Convert 1-bit image to raw bytes for ESP32"""
-        # Convert to bytes array (1 bit per pixel, packed)
-        return img.tobytes()
+        if img.mode != "1":
+            return img.tobytes()
+
+        # 1 bit per pixel, MSB first, each row padded to a whole byte (the same
+        # layout as PIL's own 1-bit encoder, which is much slower)
+        pixels = np.asarray(img, dtype=np.uint8)
+        return np.packbits(pixels, axis=1, bitorder="big").tobytes()
 
     def image_to_hex_string(self, img: Image.Image) -> str:
         """Convert 1-bit image to hex string for ESP32"""
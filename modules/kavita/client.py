@@ -3,9 +3,15 @@ Kavita API Client Module (modules/kavita/client.py)
 Handles authentication and data fetching from Kavita server
 """
 
+import asyncio
+import functools
+import time
 import httpx
+import orjson
 
-from typing import Optional, Dict, Any, List
+from collections import OrderedDict
+
+from typing import Optional, Dict, Any, List, Tuple
 from pydantic import BaseModel
 
 from config import settings
@@ -13,11 +19,40 @@ from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Book pages kept in memory; each scroll step re-reads the current page
+BOOK_PAGE_CACHE_SIZE = 32
+# Pages fetched ahead of the reader, and how many fetches may run at once
+BOOK_PAGE_PREFETCH = 3
+BOOK_PAGE_PREFETCH_CONCURRENCY = 4
+
 
 class KavitaConfig(BaseModel):
     base_url: str = "http://localhost:5000"
     api_key: str
     plugin_name: str = "ESP32Reader"
+    cache_ttl: float = 60.0
+
+
+def _ttl_cached(endpoint: str):
+    """Cache an async getter's result per (endpoint, *args) for config.cache_ttl seconds"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args):
+            key = (endpoint, *args)
+            now = time.monotonic()
+
+            cached = self._list_cache.get(key)
+            if cached and cached[0] > now:
+                return cached[1]
+
+            result = await func(self, *args)
+            self._list_cache[key] = (now + self.config.cache_ttl, result)
+            return result
+
+        return wrapper
+
+    return decorator
 
 
 class KavitaClient:
@@ -26,7 +61,21 @@ class KavitaClient:
         self.base_url = config.base_url.rstrip("/")
         self.token: Optional[str] = None
         self.user_info: Optional[Dict[str, Any]] = None
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self._auth_headers: Optional[Dict[str, str]] = None  # Built once per login
+        # One pooled client for every Kavita call: keep-alive connections are
+        # reused across requests and HTTP/2 multiplexes them when served over TLS
+        self.client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(connect=5.0, read=30.0, write=10.0, pool=5.0),
+            limits=httpx.Limits(
+                max_connections=50, max_keepalive_connections=20, keepalive_expiry=30.0
+            ),
+        )
+        self._list_cache: Dict[Tuple, Tuple[float, Any]] = {}  # {(endpoint, id): (expiry, data)}
+        self._page_cache: "OrderedDict[Tuple[int, int], str]" = OrderedDict()  # LRU
+        self._page_tasks: Dict[Tuple[int, int], asyncio.Task] = {}  # In-flight prefetches
+        self._prefetch_limit = asyncio.Semaphore(BOOK_PAGE_PREFETCH_CONCURRENCY)
+        self._page_misses: set = set()  # Pages Kavita refused, not prefetched again
 
     async def authenticate(self) -> bool:
         """Authenticate with Kavita server using API key"""
@@ -36,11 +85,16 @@ class KavitaClient:
                 params={"apiKey": self.config.api_key, "pluginName": self.config.plugin_name},
             )
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
 
             # Store token and user info from actual response structure
             self.token = data.get("token")
             self.refresh_token = data.get("refreshToken")
+            self._auth_headers = (
+                {"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"}
+                if self.token
+                else None
+            )
 
             # Store user information
             self.user_info = {
@@ -72,32 +126,40 @@ class KavitaClient:
 
     def _get_headers(self) -> Dict[str, str]:
         """Get authorization headers"""
-        if not self.token:
+        if self._auth_headers is None:
             raise ValueError("Not authenticated. Call authenticate() first.")
-        return {"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"}
+        return self._auth_headers
+
+    def invalidate_cache(self, endpoint: str, *args):
+        """Drop a cached list response so the next call refetches it"""
+        self._list_cache.pop((endpoint, *args), None)
 
+    @_ttl_cached("libraries")
     async def get_libraries(self) -> List[Dict[str, Any]]:
         """Get all libraries"""
         response = await self.client.get(
             f"{self.base_url}/api/Library/libraries", headers=self._get_headers()
         )
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
 
+    @_ttl_cached("series")
     async def get_series(self, library_id: int) -> List[Dict[str, Any]]:
         """Get all series in a library"""
         response = await self.client.post(
             f"{self.base_url}/api/Series/v2",
-            json={
-                "statements": [{"field": 19, "value": str(library_id), "comparison": 0}],
-                "combination": 1,
-                "limitTo": 0,
-                "sortOptions": {"isAscending": True, "sortField": 1},
-            },
+            content=orjson.dumps(
+                {
+                    "statements": [{"field": 19, "value": str(library_id), "comparison": 0}],
+                    "combination": 1,
+                    "limitTo": 0,
+                    "sortOptions": {"isAscending": True, "sortField": 1},
+                }
+            ),
             headers=self._get_headers(),
         )
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
 
     async def get_series_detail(self, series_id: int) -> Dict[str, Any]:
         """Get detailed information about a series"""
@@ -105,8 +167,9 @@ class KavitaClient:
             f"{self.base_url}/api/Series/{series_id}", headers=self._get_headers()
         )
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
 
+    @_ttl_cached("volumes")
     async def get_series_volumes(self, series_id: int) -> List[Dict[str, Any]]:
         """Get detailed information about a series"""
         response = await self.client.get(
@@ -114,31 +177,81 @@ class KavitaClient:
             headers=self._get_headers(),
         )
         response.raise_for_status()
-        results = response.json()
-
-        all_volumes = []
-        for volume in results["volumes"]:
-            all_volumes.append(
-                {
-                    "id": volume["id"],
-                    "name": volume["name"],
-                    "pages": volume["pages"],
-                    "seriesId": volume["seriesId"],
-                    "chapterId": volume["chapters"][0]["id"],
-                }
-            )
-
-        return all_volumes
+        results = orjson.loads(response.content)
+
+        return [
+            {
+                "id": volume["id"],
+                "name": volume["name"],
+                "pages": volume["pages"],
+                "seriesId": volume["seriesId"],
+                "chapterId": volume["chapters"][0]["id"],
+            }
+            for volume in results["volumes"]
+        ]
 
     async def get_book_page(self, chapter_id: int, page: int) -> str:
-        """Get detailed information about a series"""
+        """Get the HTML of a book page, served from an LRU cache when possible"""
+        key = (chapter_id, page)
+        if key in self._page_cache:
+            self._page_cache.move_to_end(key)
+            return self._page_cache[key]
+
+        # Already being prefetched: wait for that request instead of repeating it
+        task = self._page_tasks.get(key)
+        if task is not None:
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # The prefetch was dropped (the reader switched chapters), this
+                # request was not: fetch the page directly
+                if not task.cancelled():
+                    raise
+
+        return await self._fetch_book_page(chapter_id, page)
+
+    async def _fetch_book_page(self, chapter_id: int, page: int) -> str:
         response = await self.client.get(
             f"{self.base_url}/api/book/{chapter_id}/book-page?page={page}",
             headers=self._get_headers(),
         )
         response.raise_for_status()
+
+        self._page_cache[(chapter_id, page)] = response.text
+        if len(self._page_cache) > BOOK_PAGE_CACHE_SIZE:
+            self._page_cache.popitem(last=False)
+
         return response.text
 
+    def prefetch_book_pages(self, chapter_id: int, start: int, count: int = BOOK_PAGE_PREFETCH):
+        """Start fetching the following book pages in the background"""
+        # Pending pages of a chapter the reader has left are no longer useful
+        for key, task in list(self._page_tasks.items()):
+            if key[0] != chapter_id:
+                task.cancel()
+        self._page_misses = {key for key in self._page_misses if key[0] == chapter_id}
+
+        for page in range(start, start + count):
+            key = (chapter_id, page)
+            if key in self._page_cache or key in self._page_tasks or key in self._page_misses:
+                continue
+            task = asyncio.create_task(self._prefetch_book_page(chapter_id, page))
+            task.add_done_callback(functools.partial(self._forget_page_task, key))
+            self._page_tasks[key] = task
+
+    async def _prefetch_book_page(self, chapter_id: int, page: int) -> str:
+        async with self._prefetch_limit:
+            return await self._fetch_book_page(chapter_id, page)
+
+    def _forget_page_task(self, key: Tuple[int, int], task: asyncio.Task):
+        self._page_tasks.pop(key, None)
+        # Past the last page Kavita answers with an error; nothing to report,
+        # but remember it so every frame of the last page doesn't ask again
+        if not task.cancelled() and task.exception() is not None:
+            if isinstance(task.exception(), httpx.HTTPStatusError):
+                self._page_misses.add(key)
+            logger.debug(f"Prefetch of book page {key} failed: {task.exception()}")
+
     async def get_volumes(self, series_id: int) -> List[Dict[str, Any]]:
         """Get all volumes for a series"""
         response = await self.client.get(
@@ -147,7 +260,7 @@ class KavitaClient:
             headers=self._get_headers(),
         )
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
 
     async def get_chapter_metadata(self, chapter_id: int) -> Dict[str, Any]:
         """Get chapter metadata"""
@@ -157,7 +270,7 @@ class KavitaClient:
             headers=self._get_headers(),
         )
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
 
     async def get_book_resources(self, chapter_id: int) -> Dict[str, Any]:
         """Get book resources (for EPUB/PDF chapters)"""
@@ -166,8 +279,7 @@ class KavitaClient:
             headers=self._get_headers(),
         )
         response.raise_for_status()
-        print(response.content)
-        return response.json()
+        return orjson.loads(response.content)
 
     async def download_chapter_page(self, chapter_id: int, page: int) -> bytes:
         """Download a specific page from a chapter (for image-based formats)"""
@@ -192,7 +304,7 @@ class KavitaClient:
             headers=self._get_headers(),
         )
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
 
     async def mark_chapter_as_read(self, chapter_id: int) -> bool:
         """Mark a chapter as read"""
@@ -215,13 +327,15 @@ class KavitaClient:
         try:
             response = await self.client.post(
                 f"{self.base_url}/api/Reader/progress",
-                json={
-                    "chapterId": chapter_id,
-                    "pageNum": page_num,
-                    "volumeId": volume_id,
-                    "seriesId": series_id,
-                    "libraryId": library_id,
-                },
+                content=orjson.dumps(
+                    {
+                        "chapterId": chapter_id,
+                        "pageNum": page_num,
+                        "volumeId": volume_id,
+                        "seriesId": series_id,
+                        "libraryId": library_id,
+                    }
+                ),
                 headers=self._get_headers(),
             )
             response.raise_for_status()
@@ -239,6 +353,7 @@ config = KavitaConfig(
     base_url=settings.kavita_base_url,
     api_key=settings.kavita_api_key,
     plugin_name=settings.kavita_plugin_name,
+    cache_ttl=settings.kavita_cache_ttl,
 )
 
 kavita_client = KavitaClient(config)
@@ -1,11 +1,39 @@
 import sqlite3
+import threading
 
 DB_NAME = "epaper.db"
 
+# One connection for the whole process: state is read on every request, so
+# reopening the file (and re-reading the schema) each time dominated the cost.
+# Autocommit keeps each UPDATE its own short transaction.
+_conn = sqlite3.connect(DB_NAME, check_same_thread=False, isolation_level=None)
+_conn.row_factory = sqlite3.Row
+# Rollback journal, so every commit lands in epaper.db itself: Docker mounts
+# only that file, and a WAL's -wal/-shm siblings would be lost with the
+# container. Also converts files an earlier build left in WAL mode.
+_conn.execute("PRAGMA journal_mode=DELETE")
+_lock = threading.Lock()  # The connection is shared between threads
+
+# Columns update_state may write; keys are interpolated into the SQL text
+_ALLOWED_KEYS = frozenset(
+    {
+        "mode",
+        "selected_library_id",
+        "selected_series_id",
+        "selected_book_id",
+        "cursor_index",
+        "current_page",
+        "scroll_step",
+        "orientation",
+        "dither_mode",
+    }
+)
+_update_sql_cache = {}  # {sorted key tuple: UPDATE statement}
+
 
 def init_db():
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
+    with _lock:
+        cursor = _conn.cursor()
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS device_state (
                 id INTEGER PRIMARY KEY,
@@ -29,20 +57,25 @@ def init_db():
             )
         """)
         cursor.execute("INSERT OR IGNORE INTO device_state (id) VALUES (1)")
-        conn.commit()
 
 
 def get_state():
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-        return dict(conn.cursor().execute("SELECT * FROM device_state WHERE id = 1").fetchone())
+    with _lock:
+        return dict(_conn.execute("SELECT * FROM device_state WHERE id = 1").fetchone())
 
 
 def update_state(updates: dict):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        keys = list(updates.keys())
-        values = list(updates.values())
+    unknown = updates.keys() - _ALLOWED_KEYS
+    if unknown:
+        raise ValueError(f"Unknown device_state columns: {sorted(unknown)}")
+
+    # Same SQL text for the same columns, so sqlite3's statement cache hits
+    keys = tuple(sorted(updates))
+    sql = _update_sql_cache.get(keys)
+    if sql is None:
         set_clause = ", ".join([f"{k} = ?" for k in keys])
-        cursor.execute(f"UPDATE device_state SET {set_clause} WHERE id = 1", values)
-        conn.commit()
+        sql = f"UPDATE device_state SET {set_clause} WHERE id = 1"
+        _update_sql_cache[keys] = sql
+
+    with _lock:
+        _conn.execute(sql, [updates[k] for k in keys])
@@ -1,42 +1,148 @@
+from collections import OrderedDict
+from pathlib import Path
 from playwright.async_api import async_playwright
 from PIL import Image
+import hashlib
 import io
+import os
 import asyncio
+import math
+import struct
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Layout heights remembered for scroll views (a few bytes each)
+SCROLL_HEIGHT_CACHE_SIZE = 256
+# Book pages whose rendered scroll frames are kept (~30KB per frame)
+SCROLL_FRAME_CACHE_SIZE = 32
+
+# Rendered chapters kept in memory (~30KB per packed page)
+CHAPTER_CACHE_SIZE = 8
+# Rendered chapters persisted across restarts, keyed by content hash
+RENDER_CACHE_DIR = Path(".render_cache")
+# Disk budget for that cache; least recently used chapters are deleted first
+RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Cache file header: page count, bytes per page
+_CACHE_HEADER = struct.Struct("<II")
+# Browser pages kept open and reused between renders
+PAGE_POOL_SIZE = 2
+# Seconds a render waits for a free page before giving up
+PAGE_ACQUIRE_TIMEOUT = 30
+# Display pages taken per chapter screenshot: bounds one decoded capture
+# (~7MB RGB) and stays well under Chromium's 16384px capture limit
+CHAPTER_CAPTURE_PAGES = 20
+# Slices of a capture cut and dithered at once (each worker holds one RGB slice)
+CHAPTER_DITHER_WORKERS = 4
 
 
 class HTMLEngine:
     def __init__(self):
+        self._playwright = None
         self.browser = None
         self.context = None
         self.width = 400
         self.height = 300
-        self.cache = {}  # {chapter_id: [bytes, bytes, ...]}
-        self.current_chapter_id = None
+        self.cache = OrderedDict()  # {chapter_id: [bytes, bytes, ...]}
+        self.scroll_heights = OrderedDict()  # {(html digest, orientation): scrollHeight}
+        self.scroll_frames = OrderedDict()  # {(html digest, orientation, dither): {step: bytes}}
+        self._page_pool = asyncio.Queue(maxsize=PAGE_POOL_SIZE)
+        self._start_lock = asyncio.Lock()
+        self._replacing = set()  # Tasks opening pages for broken ones
 
     async def start(self):
         """Starts the browser. Call this on server startup."""
+        async with self._start_lock:
+            if not self.browser:
+                self._playwright = await async_playwright().start()
+                # Launch headless chromium
+                self.browser = await self._playwright.chromium.launch(
+                    headless=True,
+                    args=["--disable-dev-shm-usage", "--no-sandbox", "--font-render-hinting=none"],
+                )
+                # Create a context with our specific screen size
+                self.context = await self.browser.new_context(
+                    viewport={"width": self.width, "height": self.height}, device_scale_factor=1
+                )
+                # Opening a page costs far more than reusing one
+                for _ in range(PAGE_POOL_SIZE):
+                    self._page_pool.put_nowait(await self.context.new_page())
+                logger.info("Playwright engine started")
+
+    async def stop(self):
+        """Closes the browser and Playwright. Call this on server shutdown."""
+        async with self._start_lock:
+            if self.browser:
+                # Pooled pages belong to the context and close with it
+                while not self._page_pool.empty():
+                    self._page_pool.get_nowait()
+                await self.context.close()
+                await self.browser.close()
+                await self._playwright.stop()
+                self._playwright = self.browser = self.context = None
+                logger.info("Playwright engine stopped")
+
+    async def _acquire_page(self):
+        """Waits for a free pooled page (raises TimeoutError if none frees up)"""
         if not self.browser:
-            p = await async_playwright().start()
-            # Launch headless chromium
-            self.browser = await p.chromium.launch(headless=True)
-            # Create a context with our specific screen size
-            self.context = await self.browser.new_context(
-                viewport={"width": self.width, "height": self.height}, device_scale_factor=1
-            )
-            print("🚀 Playwright Engine Started")
+            await self.start()
+        return await asyncio.wait_for(self._page_pool.get(), PAGE_ACQUIRE_TIMEOUT)
+
+    def _release_page(self, page):
+        """Returns a page to the pool (replacing it in the background if it broke)"""
+        # The next set_content() replaces the document, so no blanking here
+        if self.context is None or page.context is not self.context:
+            return  # The engine stopped (or restarted) while the page was out
+        if not page.is_closed():
+            self._page_pool.put_nowait(page)
+            return
+
+        logger.warning("Replacing closed browser page")
+        task = asyncio.create_task(self._replace_page())
+        self._replacing.add(task)
+        task.add_done_callback(self._replacing.discard)
+
+    async def _replace_page(self):
+        context = self.context
+        try:
+            page = await context.new_page()
+        except Exception as e:
+            # The browser itself is gone; a shrinking pool would end up empty
+            logger.warning("Could not replace browser page, restarting the browser: %s", e)
+            await self._restart(context)
+            return
+        if context is self.context:
+            self._page_pool.put_nowait(page)
+
+    async def _restart(self, context):
+        """Relaunches a dead browser, unless another task already has"""
+        async with self._start_lock:
+            if self.context is not context:
+                return
+            while not self._page_pool.empty():
+                self._page_pool.get_nowait()
+            for close in (self.browser.close, self._playwright.stop):
+                try:
+                    await close()
+                except Exception:
+                    pass
+            self._playwright = self.browser = self.context = None
+
+        # Refills the pool for renders already waiting on it
+        try:
+            await self.start()
+        except Exception as e:
+            logger.warning("Browser restart failed, retrying on the next render: %s", e)
 
     async def render_chapter(self, chapter_id, html_content, renderer):
         """
         Loads HTML, scrolls through it, and captures 2-bit images.
         """
-        if self.current_chapter_id == chapter_id and chapter_id in self.cache:
+        if chapter_id in self.cache:
+            self.cache.move_to_end(chapter_id)
             return len(self.cache[chapter_id])
 
-        if not self.browser:
-            await self.start()
-
-        page = await self.context.new_page()
-
         # 1. Load Content
         # We wrap the content in a minimal structure to apply base styles
         full_html = f"""
@@ -62,55 +168,178 @@ class HTMLEngine:
         </html>
         """
 
-        await page.set_content(full_html)
-
-        # 2. Calculate Layout
-        # Wait for any images to load
-        await page.wait_for_load_state("networkidle")
+        # Same HTML at the same size renders to the same pages
+        cache_key = hashlib.sha256(
+            f"{self.width}x{self.height}:FLOYD:{full_html}".encode()
+        ).hexdigest()
+        generated_pages = await asyncio.to_thread(self._load_rendered_pages, cache_key)
+        if generated_pages is not None:
+            self._cache_chapter(chapter_id, generated_pages)
+            return len(generated_pages)
 
-        # Get total scrollable height
-        total_height = await page.evaluate("document.body.scrollHeight")
+        page = await self._acquire_page()
+        try:
+            # Pooled pages keep whatever viewport the last render used
+            await page.set_viewport_size({"width": self.width, "height": self.height})
+            await page.set_content(full_html)
+
+            # 2. Calculate Layout
+            # Wait for any images to load
+            await page.wait_for_load_state("networkidle")
+
+            # Get total scrollable height
+            total_height = await page.evaluate("document.body.scrollHeight")
+
+            logger.debug("Rendering chapter %s: height %spx", chapter_id, total_height)
+
+            # 3. Capture the chapter in a few tall screenshots
+            # One screenshot and PNG decode per CHAPTER_CAPTURE_PAGES slices
+            captures = await self._capture_chapter(page, total_height)
+        finally:
+            self._release_page(page)
+        # 4. Generate Slices (Pages)
+        # Decoding and dithering are CPU-bound, so they run in worker threads
+        # to keep other requests flowing while a chapter renders. Captures are
+        # decoded one at a time to keep memory bounded on long chapters.
+        generated_pages = []
+        for capture_height, png_bytes in captures:
+            generated_pages += await self._dither_capture(capture_height, png_bytes, renderer)
 
-        print(f"📖 Rendering Chapter {chapter_id}: Height {total_height}px")
+        # 5. Cache
+        self._cache_chapter(chapter_id, generated_pages)
+        await asyncio.to_thread(self._store_rendered_pages, cache_key, generated_pages)
 
-        # 3. Generate Slices (Pages)
-        generated_pages = []
+        return len(generated_pages)
 
-        # Loop through the content in 300px chunks
-        for y in range(0, total_height, self.height):
-            # Take screenshot of the specific region
-            # clip: {x, y, width, height}
-            # Note: We clamp height if we are at the very bottom
-            clip_height = min(self.height, total_height - y)
+    async def _capture_chapter(self, page, total_height):
+        """Screenshots the chapter as [(height, png_bytes)], top to bottom"""
+        capture_height = self.height * CHAPTER_CAPTURE_PAGES
+        captures = []
 
+        for top in range(0, total_height, capture_height):
+            height = min(capture_height, total_height - top)
             png_bytes = await page.screenshot(
-                clip={"x": 0, "y": y, "width": self.width, "height": clip_height}
+                full_page=True, clip={"x": 0, "y": top, "width": self.width, "height": height}
             )
 
-            # 4. Post-Process (Convert PNG -> E-Ink 2-bit)
-            # We use Pillow to load the screenshot bytes
-            img = Image.open(io.BytesIO(png_bytes))
-
-            # Handle partial last page (pad with white if < 300px)
-            if clip_height < self.height:
-                new_img = Image.new("RGB", (self.width, self.height), (255, 255, 255))
-                new_img.paste(img, (0, 0))
-                img = new_img
-
-            # Use Renderer to Dither & Pack
-            # We assume we want "FLOYD" dithering for HTML (handles images better)
-            # Or "THRESHOLD" for pure text.
-            # Ideally, pass this pref from DB. using FLOYD for generic HTML is safer.
-            packed = renderer.process_external_image(img, "FLOYD")
-            generated_pages.append(packed)
-
-        await page.close()
-
-        # 5. Cache
-        self.cache = {chapter_id: generated_pages}
-        self.current_chapter_id = chapter_id
+            # Reading the PNG header is cheap, decoding happens later
+            captured_height = Image.open(io.BytesIO(png_bytes)).height
+            if captured_height >= height:
+                captures.append((height, png_bytes))
+                continue
+
+            # A short capture would leave blank pages; retake it slice by slice
+            logger.warning(
+                "Chapter capture at %spx came back %spx of %spx, "
+                "falling back to per-page screenshots",
+                top,
+                captured_height,
+                height,
+            )
+            for y in range(top, top + height, self.height):
+                clip_height = min(self.height, total_height - y)
+                png_bytes = await page.screenshot(
+                    full_page=True,
+                    clip={"x": 0, "y": y, "width": self.width, "height": clip_height},
+                )
+                captures.append((clip_height, png_bytes))
+
+        return captures
+
+    async def _dither_capture(self, capture_height, png_bytes, renderer):
+        """Cuts one chapter screenshot into pages and dithers them"""
+        full_img = await asyncio.to_thread(self._decode_capture, png_bytes)
+        limit = asyncio.Semaphore(CHAPTER_DITHER_WORKERS)
+
+        async def dither(y):
+            async with limit:
+                return await asyncio.to_thread(
+                    self._dither_slice, full_img, capture_height, y, renderer
+                )
 
-        return len(generated_pages)
+        # Loop through the content in 300px chunks
+        return await asyncio.gather(*[dither(y) for y in range(0, capture_height, self.height)])
+
+    @staticmethod
+    def _decode_capture(png_bytes):
+        return Image.open(io.BytesIO(png_bytes)).convert("RGB")
+
+    def _dither_slice(self, full_img, capture_height, y, renderer):
+        """Crops the page at y and packs it; the RGB slice is dropped on return"""
+        # Note: We clamp height if we are at the very bottom
+        clip_height = min(self.height, capture_height - y, full_img.height - y)
+
+        img = full_img.crop((0, y, self.width, y + max(clip_height, 0)))
+
+        # Handle partial last page (pad with white if < 300px)
+        if clip_height < self.height:
+            new_img = Image.new("RGB", (self.width, self.height), (255, 255, 255))
+            new_img.paste(img, (0, 0))
+            img = new_img
+
+        # Use Renderer to Dither & Pack
+        # We assume we want "FLOYD" dithering for HTML (handles images better)
+        # Or "THRESHOLD" for pure text.
+        # Ideally, pass this pref from DB. using FLOYD for generic HTML is safer.
+        # Pages are rendered at the landscape size, so no rotation
+        return renderer.process_external_image(img, "FLOYD", 0)
+
+    def _cache_chapter(self, chapter_id, pages):
+        self.cache[chapter_id] = pages
+        self.cache.move_to_end(chapter_id)
+        if len(self.cache) > CHAPTER_CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+    def _load_rendered_pages(self, cache_key):
+        """Returns the cached pages for a content hash, or None on a miss"""
+        path = RENDER_CACHE_DIR / f"{cache_key}.bin"
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # Mark as recently used for _prune_render_cache
+        except OSError:
+            return None
+
+        offset = _CACHE_HEADER.size
+        if len(data) < offset:
+            return None
+        count, page_size = _CACHE_HEADER.unpack_from(data)
+        if len(data) != offset + count * page_size:
+            return None  # Truncated or foreign file, render again
+        return [data[offset + i * page_size : offset + (i + 1) * page_size] for i in range(count)]
+
+    def _store_rendered_pages(self, cache_key, pages):
+        # Every packed page has the same size, so the file is header + pages
+        page_size = len(pages[0]) if pages else 0
+        path = RENDER_CACHE_DIR / f"{cache_key}.bin"
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            RENDER_CACHE_DIR.mkdir(exist_ok=True)
+            tmp_path.write_bytes(_CACHE_HEADER.pack(len(pages), page_size) + b"".join(pages))
+            os.replace(tmp_path, path)  # Atomic, readers never see half a file
+        except OSError as e:
+            logger.warning("Could not write render cache: %s", e)
+            return
+        self._prune_render_cache()
+
+    def _prune_render_cache(self):
+        """Deletes the least recently used cache files beyond RENDER_CACHE_MAX_BYTES"""
+        entries = []
+        for path in RENDER_CACHE_DIR.glob("*.bin"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # Removed meanwhile
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= RENDER_CACHE_MAX_BYTES:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
 
     def get_page_image(self, chapter_id, page_index):
         if chapter_id in self.cache:
@@ -125,18 +354,29 @@ class HTMLEngine:
         """
         Renders the view with dynamic viewport based on orientation.
         """
-        if not self.browser:
-            await self.start()
-
-        page = await self.context.new_page()
-
         # 1. SET DYNAMIC VIEWPORT
         if orientation == 1:  # Portrait
             view_w, view_h = 300, 400
         else:  # Landscape
             view_w, view_h = 400, 300
 
-        await page.set_viewport_size({"width": view_w, "height": view_h})
+        # Layout only depends on the content and viewport, so once a page has
+        # been measured the step count and "NEXT" checks skip the browser.
+        digest = hashlib.blake2b(html_content.encode(), digest_size=16).digest()
+        height_key = (digest, orientation)
+        if height_key in self.scroll_heights:
+            self.scroll_heights.move_to_end(height_key)
+            bounds = self._check_scroll_bounds(self.scroll_heights[height_key], scroll_step, view_h)
+            if bounds is not None:
+                return bounds
+
+        # Scrolling back over a page returns frames that were already rendered
+        frame_key = (digest, orientation, dither_mode)
+        frames = self.scroll_frames.get(frame_key)
+        if frames is not None:
+            self.scroll_frames.move_to_end(frame_key)
+            if scroll_step in frames:
+                return frames[scroll_step]
 
         # 2. Inject CSS
         full_html = f"""
@@ -161,42 +401,65 @@ class HTMLEngine:
             <body>{html_content}</body>
         </html>
         """
-        await page.set_content(full_html)
-        await page.wait_for_load_state("networkidle")
 
-        # 3. Check Bounds (Using dynamic view_h)
-        total_height = int(await page.evaluate("document.body.scrollHeight"))
-        current_y = scroll_step * view_h
+        page = await self._acquire_page()
+        try:
+            await page.set_viewport_size({"width": view_w, "height": view_h})
+            await page.set_content(full_html)
+            await page.wait_for_load_state("networkidle")
+
+            # 3. Check Bounds (Using dynamic view_h)
+            total_height = int(await page.evaluate("document.body.scrollHeight"))
+            current_y = scroll_step * view_h
+
+            self.scroll_heights[height_key] = total_height
+            if len(self.scroll_heights) > SCROLL_HEIGHT_CACHE_SIZE:
+                self.scroll_heights.popitem(last=False)
+
+            bounds = self._check_scroll_bounds(total_height, scroll_step, view_h)
+            if bounds is not None:
+                return bounds
+
+            # 4. Screenshot
+            await page.evaluate(f"window.scrollTo(0, {max(current_y - 40, 0)})")
+
+            try:
+                png_bytes = await page.screenshot()
+            except Exception as e:
+                logger.warning("Boundary error (skipping to next): %s", e)
+                return "NEXT"
+        finally:
+            self._release_page(page)
+
+        # 5. Process (in a worker thread, dithering would stall the event loop)
+        frame = await asyncio.to_thread(
+            self._process_screenshot, png_bytes, renderer, dither_mode, orientation
+        )
+
+        self.scroll_frames.setdefault(frame_key, {})[scroll_step] = frame
+        self.scroll_frames.move_to_end(frame_key)
+        if len(self.scroll_frames) > SCROLL_FRAME_CACHE_SIZE:
+            self.scroll_frames.popitem(last=False)
+
+        return frame
+
+    @staticmethod
+    def _process_screenshot(png_bytes, renderer, dither_mode, orientation):
+        img = Image.open(io.BytesIO(png_bytes))
+
+        # Pass orientation to renderer so it knows to rotate
+        return renderer.process_external_image(img, dither_mode, orientation)
 
+    def _check_scroll_bounds(self, total_height, scroll_step, view_h):
+        """Returns "NEXT", the last step index (for step -1), or None to render"""
         # If we are strictly past the content, go to next page
-        if current_y >= total_height and scroll_step > 0:
-            await page.close()
+        if scroll_step * view_h >= total_height and scroll_step > 0:
             return "NEXT"
 
         if scroll_step == -1:
-            import math
+            return max(0, math.ceil(total_height / view_h) - 1)
 
-            max_steps = max(0, math.ceil(total_height / view_h) - 1)
-            await page.close()
-            return max_steps
-
-        # 4. Screenshot
-        await page.evaluate(f"window.scrollTo(0, {max(current_y - 40, 0)})")
-
-        try:
-            png_bytes = await page.screenshot()
-        except Exception as e:
-            print(f"⚠️ Boundary Error (Skipping to Next): {e}")
-            await page.close()
-            return "NEXT"
-
-        await page.close()
-
-        # 5. Process
-        img = Image.open(io.BytesIO(png_bytes))
-
-        # Pass orientation to renderer so it knows to rotate
-        return renderer.process_external_image(img, dither_mode, orientation)
+        return None
 
 
 # Global Instance
@@ -1,6 +1,21 @@
 from PIL import Image, ImageDraw, ImageFont
+import functools
 import io
 
+# --- LIST VIEW DIMENSIONS ---
+LIST_HEADER_HEIGHT = 30
+LIST_ROW_HEIGHT = 28
+LIST_START_Y = 35
+LIST_SIDE_MARGIN = 0
+LIST_MAX_VISIBLE_ITEMS = 9  # Items per page
+
+# Palette indices, for drawing straight into a "P" canvas
+BLACK, DARK_GRAY, LIGHT_GRAY, WHITE = 0, 1, 2, 3
+
+# 4 gray levels (Black, Dark Gray, Light Gray, White), padded with zeros to
+# exactly 768 values (256 colors * 3 RGB channels)
+_PALETTE_BYTES = bytes([0, 0, 0, 85, 85, 85, 170, 170, 170, 255, 255, 255]) + bytes(768 - 12)
+
 
 class Renderer:
     def __init__(self):
@@ -8,29 +23,8 @@ class Renderer:
         self.NATIVE_HEIGHT = 300
 
         # 1. Create a 4-color palette image for quantization
-        # We need exactly 768 values (256 colors * 3 RGB channels)
         self.palette_img = Image.new("P", (1, 1))
-
-        # Define 4 gray levels
-        palette_data = [
-            0,
-            0,
-            0,  # Index 0: Black
-            85,
-            85,
-            85,  # Index 1: Dark Gray
-            170,
-            170,
-            170,  # Index 2: Light Gray
-            255,
-            255,
-            255,  # Index 3: White
-        ]
-
-        # Pad with zeros to reach exactly 768 integers
-        palette_data += [0] * (768 - len(palette_data))
-
-        self.palette_img.putpalette(palette_data)
+        self.palette_img.putpalette(_PALETTE_BYTES)
 
         try:
             self.font = ImageFont.truetype("arial.ttf", 14)
@@ -39,66 +33,93 @@ class Renderer:
             self.font = ImageFont.load_default()
             self.header_font = ImageFont.load_default()
 
+        # Header and separators only change with the title and row count
+        self._list_chrome = functools.lru_cache(maxsize=32)(self._build_list_chrome)
+        # Moving the cursor back and forth revisits the same frames
+        self._list_frames = functools.lru_cache(maxsize=64)(self._draw_list_view)
+        # Counter strings ("5/24") repeat across frames and lists
+        self._count_width = functools.lru_cache(maxsize=4096)(self._measure_count)
+
     def _pack_2bit(self, img: Image.Image) -> bytes:
         """Packs a 4-color indexed image (mode P) into raw 2-bit bytes."""
-        pixels = list(img.getdata())
-        packed_data = bytearray(len(pixels) // 4)
-
-        for i in range(0, len(pixels), 4):
-            # SAFTEY FIX: Use bitwise AND 3 (& 3)
-            # If Pillow picks Index 4 (Black) instead of Index 0 (Black),
-            # this forces it back to 0 (00), preventing byte overflow.
-            p0 = pixels[i] & 3
-            p1 = pixels[i + 1] & 3
-            p2 = pixels[i + 2] & 3
-            p3 = pixels[i + 3] & 3
-
-            # Pack: [P0 P1 P2 P3]
-            byte_val = (p0 << 6) | (p1 << 4) | (p2 << 2) | p3
-            packed_data[i // 4] = byte_val
-
-        return bytes(packed_data)
+        # Pillow's C "P;2" packer handles the whole frame.
+        # Pack: [P0 P1 P2 P3], first pixel in the high bits. Rows are padded to
+        # a whole byte, which 400px-wide frames never need.
+        # SAFTEY FIX: the packer keeps only the low two bits of each index, so
+        # if Pillow picks Index 4 (Black) instead of Index 0 (Black) it still
+        # packs as 0 (00), preventing byte overflow.
+        return img.tobytes("raw", "P;2")
+
+    def _build_list_chrome(self, title: str, visible_rows: int) -> Image.Image:
+        """Draws the static parts of a list view: header bar, title, row separators"""
+        # Drawn in palette indices, so frames need no quantize() pass
+        img = Image.new("P", (400, 300), WHITE)
+        img.putpalette(_PALETTE_BYTES)
+        draw = ImageDraw.Draw(img)
+        # Keep antialiased text. This relies on Pillow blending glyph edges
+        # numerically between palette indices, which only works because the
+        # indices run in gray order (gray = index * 85); edges can land one
+        # level off from what quantize() picked
+        draw.fontmode = "L"
+
+        draw.rectangle((0, 0, 400, LIST_HEADER_HEIGHT), fill=BLACK)
+        draw.text((15, 6), title, font=self.header_font, fill=WHITE)
+
+        for i in range(visible_rows):
+            line_y = LIST_START_Y + (i * LIST_ROW_HEIGHT) + LIST_ROW_HEIGHT - 1
+            draw.line(
+                (LIST_SIDE_MARGIN + 5, line_y, 400 - LIST_SIDE_MARGIN - 5, line_y),
+                fill=LIGHT_GRAY,
+            )
+
+        return img
+
+    def _measure_count(self, text: str) -> int:
+        """Rendered width of a header counter, in pixels"""
+        return int(self.font.getlength(text))
+
+    def _quantize(self, img: Image.Image, dither_mode: str) -> Image.Image:
+        """Maps an image onto the 4-gray palette ("FLOYD" dithers, anything else snaps)"""
+        if dither_mode == "FLOYD":
+            dither = Image.Dither.FLOYDSTEINBERG
+        else:
+            dither = Image.Dither.NONE
+        return img.quantize(palette=self.palette_img, dither=dither)
 
     def render_list_view(self, title: str, items: list, cursor_index: int) -> bytes:
-        # 1. Create Canvas (RGB)
-        img = Image.new("RGB", (400, 300), (255, 255, 255))
-        draw = ImageDraw.Draw(img)
+        # Keyed on the item names themselves, so a changed list is a new frame
+        return self._list_frames(title, tuple(items), cursor_index)
 
+    def _draw_list_view(self, title: str, items: tuple, cursor_index: int) -> bytes:
         # --- DIMENSIONS ---
-        header_height = 30
-        row_height = 28
-        start_y = 35
-        side_margin = 0
-        max_visible_items = 9  # Items per page
+        header_height = LIST_HEADER_HEIGHT
+        row_height = LIST_ROW_HEIGHT
+        start_y = LIST_START_Y
+        side_margin = LIST_SIDE_MARGIN
+        max_visible_items = LIST_MAX_VISIBLE_ITEMS
 
         # Calculate Scrolling Window
         # This determines which slice of the list to show
         total_items = len(items)
 
         # Simple Logic: Keep cursor somewhat centered or page by page
-        # Here we just calculate the 'start_index' (top item visible)
-        if total_items <= max_visible_items:
-            start_index = 0
-        else:
-            # Try to keep cursor in the middle
-            half_window = max_visible_items // 2
-            start_index = cursor_index - half_window
-
-            # Clamp bounds
-            if start_index < 0:
-                start_index = 0
-            if start_index + max_visible_items > total_items:
-                start_index = total_items - max_visible_items
-
-        # 2. Draw Header
-        draw.rectangle((0, 0, 400, header_height), fill=(0, 0, 0))
-        draw.text((15, 6), title, font=self.header_font, fill=(255, 255, 255))
+        # Here we just calculate the 'start_index' (top item visible):
+        # try to keep the cursor in the middle, clamped so the window stays
+        # inside the list (a short list always starts at 0)
+        half_window = max_visible_items // 2
+        last_start = max(0, total_items - max_visible_items)
+        start_index = max(0, min(cursor_index - half_window, last_start))
+
+        # 1. Start from the cached canvas (palette) with the header and separators
+        img = self._list_chrome(title, min(total_items, max_visible_items)).copy()
+        draw = ImageDraw.Draw(img)
+        draw.fontmode = "L"  # Antialiased text, as in _build_list_chrome
 
-        # Draw Counter (e.g., "5/24") in the header right side
+        # 2. Draw Counter (e.g., "5/24") in the header right side
         count_text = f"{cursor_index + 1}/{total_items}"
-        # Calculate text width to align right (approximate width calc)
-        text_w = len(count_text) * 8
-        draw.text((390 - text_w, 8), count_text, font=self.font, fill=(255, 255, 255))
+        # Calculate text width to align right
+        text_w = self._count_width(count_text)
+        draw.text((390 - text_w, 8), count_text, font=self.font, fill=WHITE)
 
         # 3. Draw Visible Items
         box_left = side_margin
@@ -117,17 +138,15 @@ class Renderer:
             text_y_offset = 5
 
             if item_idx == cursor_index:
+                # The selected row has no separator
+                line_y = y + row_height - 1
+                draw.line((box_left + 5, line_y, box_right - 5, line_y), fill=WHITE)
                 # Selection Box
-                draw.rectangle((box_left, y, box_right, y + row_height - 2), fill=(85, 85, 85))
-                draw.text(
-                    (text_x, y + text_y_offset), f"> {item}", font=self.font, fill=(255, 255, 255)
-                )
+                draw.rectangle((box_left, y, box_right, y + row_height - 2), fill=DARK_GRAY)
+                draw.text((text_x, y + text_y_offset), f"> {item}", font=self.font, fill=WHITE)
             else:
-                # Normal Text
-                draw.text((text_x, y + text_y_offset), item, font=self.font, fill=(0, 0, 0))
-                # Separator
-                line_y = y + row_height - 1
-                draw.line((box_left + 5, line_y, box_right - 5, line_y), fill=(170, 170, 170))
+                # Normal Text (the separator is part of the cached canvas)
+                draw.text((text_x, y + text_y_offset), item, font=self.font, fill=BLACK)
 
         # 4. Draw Scrollbar (Right Edge)
         if total_items > max_visible_items:
@@ -138,7 +157,7 @@ class Renderer:
             track_height = track_y_end - track_y_start
 
             # Draw Track Line
-            draw.line((track_x + 2, track_y_start, track_x + 2, track_y_end), fill=(170, 170, 170))
+            draw.line((track_x + 2, track_y_start, track_x + 2, track_y_end), fill=LIGHT_GRAY)
 
             # Calculate Thumb Size & Position
             # Thumb height is proportional to visible percentage
@@ -154,11 +173,10 @@ class Renderer:
                 thumb_y = track_y_start
 
             # Draw Thumb (Black Bar)
-            draw.rectangle((track_x, thumb_y, track_x + 4, thumb_y + thumb_height), fill=(0, 0, 0))
+            draw.rectangle((track_x, thumb_y, track_x + 4, thumb_y + thumb_height), fill=BLACK)
 
-        # 5. Quantize & Pack
-        final_img = img.quantize(palette=self.palette_img, dither=Image.Dither.NONE)
-        return self._pack_2bit(final_img)
+        # 5. Pack (already in palette indices)
+        return self._pack_2bit(img)
 
     def render_page(self, page_num: int, content: str, orientation: int, dither_mode: str) -> bytes:
         # 1. Setup Canvas
@@ -178,15 +196,12 @@ class Renderer:
 
         # Rotate if Portrait
         if orientation == 1:
-            img = img.rotate(90, expand=True)
+            img = img.transpose(Image.Transpose.ROTATE_90)
 
         # 4. Conditional Dithering
         # - FLOYD: Adds noise to smooth out gradients (Good for images/manga)
         # - NONE: Snaps to nearest color (Good for text)
-        if dither_mode == "FLOYD":
-            final_img = img.quantize(palette=self.palette_img, dither=Image.Dither.FLOYDSTEINBERG)
-        else:
-            final_img = img.quantize(palette=self.palette_img, dither=Image.Dither.NONE)
+        final_img = self._quantize(img, dither_mode)
 
         return self._pack_2bit(final_img)
 
@@ -197,16 +212,13 @@ class Renderer:
         # 1. Rotate if Portrait
         if orientation == 1:
             # Input: 300x400 -> Output: 400x300
-            img = img.rotate(90, expand=True)
+            img = img.transpose(Image.Transpose.ROTATE_90)
 
         # 2. Ensure RGB
         if img.mode != "RGB":
             img = img.convert("RGB")
 
         # 3. Apply Dithering
-        if dither_mode == "FLOYD":
-            final_img = img.quantize(palette=self.palette_img, dither=Image.Dither.FLOYDSTEINBERG)
-        else:
-            final_img = img.quantize(palette=self.palette_img, dither=Image.Dither.NONE)
+        final_img = self._quantize(img, dither_mode)
 
         return self._pack_2bit(final_img)
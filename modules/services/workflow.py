@@ -1,10 +1,42 @@
+import asyncio
+
 import modules.services.database as db
 
 from modules.kavita.client import kavita_client
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Held scroll buttons repeat quickly; their steps are written once per window
+SCROLL_FLUSH_DELAY = 0.05
 
 
 class WorkflowManager:
+    def __init__(self):
+        self._pending_scroll = 0  # Scroll steps not yet written to the DB
+        self._flush_handle = None
+
+    def flush_scroll(self):
+        """Writes buffered scroll steps to the DB. Call before reading scroll_step."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending_scroll:
+            step = db.get_state()["scroll_step"]
+            db.update_state({"scroll_step": step + self._pending_scroll})
+            self._pending_scroll = 0
+
+    def _queue_scroll(self, delta):
+        self._pending_scroll += delta
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                SCROLL_FLUSH_DELAY, self.flush_scroll
+            )
+
     async def handle_input(self, button: str, event_type: str):
+        # Scrolls are buffered; every other input acts on the settled position
+        if button not in ("A", "B"):
+            self.flush_scroll()
         state = db.get_state()
         mode = state["mode"]
         cursor = state["cursor_index"]
@@ -37,8 +69,10 @@ class WorkflowManager:
             if cursor < len(libraries):
                 selected_item = libraries[cursor]
                 real_id = selected_item["id"]
-                print(f"-> Selected Library: {selected_item['name']} (ID: {real_id})")
+                logger.info("Selected library: %s (ID: %s)", selected_item["name"], real_id)
 
+                # Entering a list always shows fresh data; scrolling it hits the cache
+                kavita_client.invalidate_cache("series", real_id)
                 db.update_state(
                     {"mode": "SERIES", "selected_library_id": real_id, "cursor_index": 0}
                 )
@@ -53,12 +87,14 @@ class WorkflowManager:
             if cursor < len(items):
                 selected_item = items[cursor]
                 real_id = selected_item["id"]
-                print(f"-> Selected Series: {selected_item['name']} (ID: {real_id})")
+                logger.info("Selected series: %s (ID: %s)", selected_item["name"], real_id)
 
+                kavita_client.invalidate_cache("volumes", real_id)
                 db.update_state({"mode": "BOOKS", "selected_series_id": real_id, "cursor_index": 0})
 
         elif button == "D":  # BACK
-            print("<- Back to Libraries")
+            logger.debug("Back to libraries")
+            kavita_client.invalidate_cache("libraries")
             db.update_state(
                 {
                     "mode": "LIBRARIES",
@@ -75,30 +111,30 @@ class WorkflowManager:
             if cursor < len(items):
                 selected_item = items[cursor]
                 real_id = selected_item["chapterId"]
-                print(f"-> Opening Book: {selected_item['name']} (ID: {real_id})")
+                logger.info("Opening book: %s (ID: %s)", selected_item["name"], real_id)
 
                 db.update_state({"mode": "READER", "selected_book_id": real_id, "current_page": 0})
 
         elif button == "D":  # BACK
-            print("<- Back to Series")
+            logger.debug("Back to series")
+            kavita_client.invalidate_cache("series", state["selected_library_id"])
             db.update_state({"mode": "SERIES", "cursor_index": 0})
 
     def _handle_reader(self, button, state, event_type):
         page = state["current_page"]
-        step = state["scroll_step"]
 
         # --- SCROLLING (Fine Control) ---
         if button == "A":  # SCROLL UP
             # Decrement step. Server handles "Underflow" (going to prev page bottom)
-            db.update_state({"scroll_step": step - 1})
+            self._queue_scroll(-1)
 
         elif button == "B":  # SCROLL DOWN
             # Increment step. Server handles "Overflow" (going to next page top)
-            db.update_state({"scroll_step": step + 1})
+            self._queue_scroll(1)
 
         # --- JUMPING (Page Control) ---
         elif button == "F":  # NEXT PAGE (Direct Jump)
-            print("⏩ Jumping to Next Page")
+            logger.debug("Jumping to next page")
             db.update_state(
                 {
                     "current_page": page + 1,
@@ -107,7 +143,7 @@ class WorkflowManager:
             )
 
         elif button == "C":  # PREV PAGE (Direct Jump)
-            print("⏪ Jumping to Previous Page")
+            logger.debug("Jumping to previous page")
             db.update_state(
                 {
                     "current_page": max(0, page - 1),
@@ -117,6 +153,7 @@ class WorkflowManager:
 
         # --- SYSTEM ---
         elif button == "D":  # BACK TO LIST
+            kavita_client.invalidate_cache("volumes", state["selected_series_id"])
             db.update_state({"mode": "BOOKS", "cursor_index": 0})
 
         elif button == "E":  # MENU / SETTINGS
@@ -1,55 +1,79 @@
+import atexit
+import functools
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from colorlog import ColoredFormatter
 
 LOG_DIR = ".logs"
 LOG_FILE = "automation.log"
 
+_LOG_COLORS = {
+    "DEBUG": "cyan",
+    "INFO": "green",
+    "WARNING": "yellow",
+    "ERROR": "red",
+    "CRITICAL": "bold_red",
+}
 
-def get_logger(name: str = "") -> logging.Logger:
-    os.makedirs(LOG_DIR, exist_ok=True)
-    logger = logging.getLogger(name)
-    logger.propagate = False  # Prevent duplicate logs from bubbling up
+# Formatters hold no per-logger state, so they are built once at import
+_FMT_NAMED = ColoredFormatter(
+    "%(log_color)s[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+    log_colors=_LOG_COLORS,
+)
+_FMT_ANON = ColoredFormatter(
+    "%(log_color)s[%(asctime)s] [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+    log_colors=_LOG_COLORS,
+)
+_FILE_FMT = logging.Formatter(
+    "[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
 
-    if logger.handlers:
-        return logger
+# Loggers only enqueue records; one background thread does the writing
+_log_queue = queue.SimpleQueue()
+_listener = None
 
-    text_format = ""
-
-    if name != "":
-        text_format = (
-            "%(log_color)s[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s"
-        )
-    else:
-        text_format = "%(log_color)s[%(asctime)s] [%(levelname)s] %(message)s"
-
-    color_formatter = ColoredFormatter(
-        text_format,
-        datefmt="%Y-%m-%d %H:%M:%S",
-        log_colors={
-            "DEBUG": "cyan",
-            "INFO": "green",
-            "WARNING": "yellow",
-            "ERROR": "red",
-            "CRITICAL": "bold_red",
-        },
-    )
 
+def _start_listener():
+    global _listener
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    # The root logger prints without its name, every other logger with it
     console_handler = logging.StreamHandler()
-    console_handler.setFormatter(color_formatter)
+    console_handler.setFormatter(_FMT_NAMED)
+    console_handler.addFilter(lambda record: record.name != "root")
+
+    root_console_handler = logging.StreamHandler()
+    root_console_handler.setFormatter(_FMT_ANON)
+    root_console_handler.addFilter(lambda record: record.name == "root")
 
     file_handler = RotatingFileHandler(
         os.path.join(LOG_DIR, LOG_FILE), maxBytes=5_000_000, backupCount=3
     )
-    file_formatter = logging.Formatter(
-        "[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-    file_handler.setFormatter(file_formatter)
+    file_handler.setFormatter(_FILE_FMT)
+
+    _listener = QueueListener(_log_queue, console_handler, root_console_handler, file_handler)
+    _listener.start()
+    atexit.register(_listener.stop)  # Drains the queue before exit
+
+
+@functools.lru_cache(maxsize=None)
+def get_logger(name: str = "") -> logging.Logger:
+    logger = logging.getLogger(name)
+    if logger.handlers:
+        return logger
+
+    logger.propagate = False  # Prevent duplicate logs from bubbling up
+
+    if _listener is None:
+        _start_listener()
 
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    logger.addHandler(QueueHandler(_log_queue))
 
     return logger
 